@@ -1,44 +1,99 @@
 """Orbital Sentinel — CRE AI Analysis Endpoint
 
-Standalone Flask server that receives CRE workflow snapshots
-and returns AI risk assessments.
+Standalone Quart (async Flask) server that receives CRE workflow snapshots
+and returns AI risk assessments. LLM calls use the async provider clients,
+so one process can hold many analyses in flight at once.
 
 Supports two AI providers:
   - OpenAI (GPT-5.3 Codex) — primary, used for arb + composite analysis
   - Anthropic (Claude Haiku) — used for treasury analysis
 
 Usage:
-    pip install flask openai anthropic
+    pip install quart hypercorn openai anthropic orjson
     export OPENAI_API_KEY=your_key        # Required for arb + composite analysis
     export ANTHROPIC_API_KEY=your_key     # Required for treasury analysis
     export CRE_ANALYZE_SECRET=optional_shared_secret
-    python cre_analyze_endpoint.py
+    python cre_analyze_endpoint.py        # single Hypercorn worker on HOST:PORT
+    # or, multi-process:
+    hypercorn cre_analyze_endpoint:app --bind 127.0.0.1:5000 --workers 2
+    # Either way, LOG_LEVEL (default INFO) sets app logging unless a root handler already exists.
 
 Endpoints:
-    POST /api/cre/analyze           — Treasury risk assessment (Anthropic)
+    POST /api/cre/analyze           — Treasury risk assessment (Anthropic); ?no_llm=1 for atoms only
     POST /api/cre/analyze-arb       — Arb vault market analysis (OpenAI)
+        Both accept ?stream=1 to receive NDJSON: {"delta": ...} lines as the
+        model writes, then a final {"result": ...} or {"error": ...} line.
     POST /api/cre/analyze-composite — Cross-workflow composite LAA analysis (OpenAI)
     POST /api/cre/analyze-bridge    — SDL CCIP Bridge vault risk analysis (GPT-5.2)
+    POST /api/cre/analyze-batch     — Bulk treasury assessments via Message Batches (Anthropic)
+    GET  /api/cre/analyze-batch/<id> — Status/results of a submitted batch
+    POST /api/cre/analyze-both      — Treasury + arb assessments run concurrently
+    GET  /api/cre/metrics           — Response cache hit/miss counters
 """
 
+import asyncio
+import functools
+import hashlib
 import hmac
 import json
 import logging
 import os
 import re
 import time
+from collections import OrderedDict
+from datetime import datetime
 from pathlib import Path
 
+import anthropic
+import orjson
 from dotenv import load_dotenv
-from flask import Flask, Blueprint, jsonify, request
+from openai import AsyncOpenAI
+from quart import Quart, Blueprint, Response, jsonify, request
+from quart.json.provider import DefaultJSONProvider
+
+from cre_prompts import (
+    _ARB_SYSTEM_PROMPT,
+    _ARB_TEXT_FORMAT,
+    _COMPOSITE_SYSTEM_PROMPT,
+    _INJECTION_PATTERNS,
+    _SYSTEM_PROMPT,
+    _TREASURY_TOOL,
+    _compute_atoms,
+    _format_arb_prompt,
+    _format_atoms,
+    _format_composite_prompt,
+    _format_prompt,
+    _risk_label,
+    _sanitize_str,
+)
 
 # Load .env from repo root (one level up from platform/)
 load_dotenv(Path(__file__).resolve().parent.parent / ".env")
 
-logging.basicConfig(level=logging.INFO)
+# Logging is configured when serving starts (see _configure_logging), not on import.
 logger = logging.getLogger(__name__)
 
-app = Flask(__name__)
+
+class _OrjsonProvider(DefaultJSONProvider):
+    """JSON provider backed by orjson (Rust) instead of the stdlib json module.
+
+    Output is always compact and keeps insertion order, so the pretty-print and
+    sort-keys knobs of the default provider have no effect here.
+    """
+
+    sort_keys = False
+    compact = True
+
+    def dumps(self, obj, **kwargs) -> str:
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
+app = Quart(__name__)
+app.json_provider_class = _OrjsonProvider
+app.json = _OrjsonProvider(app)
 cre_bp = Blueprint("cre", __name__)
 
 # ── Rate Limiting (in-memory, per-process) ────────────────────────────
@@ -54,9 +109,15 @@ def _rate_limit_check(max_per_hour: int = 60) -> bool:
     _request_times.append(now)
     return True
 
+# Secrets and API keys are read once at import (after load_dotenv); restart to rotate.
 _CRE_SECRET = os.environ.get("CRE_ANALYZE_SECRET", "")
 if not _CRE_SECRET:
     logger.warning("CRE_ANALYZE_SECRET not set. All endpoints will reject requests until configured.")
+_BRIDGE_SECRET = os.environ.get("CRE_SECRET", "") or _CRE_SECRET
+_CRE_SECRET_BYTES = _CRE_SECRET.encode()
+_BRIDGE_SECRET_BYTES = _BRIDGE_SECRET.encode()
+_ANTHROPIC_KEY = os.environ.get("ANTHROPIC_API_KEY", "")
+_OPENAI_KEY = os.environ.get("OPENAI_API_KEY", "")
 
 # ─── Per-tenant circuit breaker (MED: prevents one tenant from exhausting API budget) ───
 DAILY_API_CALL_LIMIT = int(os.environ.get("DAILY_API_CALL_LIMIT", "500"))
@@ -64,52 +125,128 @@ _daily_api_calls_per_tenant: dict[str, int] = {}
 _circuit_reset_date_per_tenant: dict[str, str] = {}
 
 
-def _check_circuit_breaker(tenant_id: str = "default") -> bool:
+def _check_circuit_breaker(tenant_id: str = "default", calls: int = 1) -> bool:
     """Per-tenant daily API call limit. Returns True if call is allowed, False if tripped."""
     today = datetime.utcnow().strftime("%Y-%m-%d")
     if _circuit_reset_date_per_tenant.get(tenant_id) != today:
         _daily_api_calls_per_tenant[tenant_id] = 0
         _circuit_reset_date_per_tenant[tenant_id] = today
-    _daily_api_calls_per_tenant[tenant_id] += 1
+    _daily_api_calls_per_tenant[tenant_id] += calls
     if _daily_api_calls_per_tenant[tenant_id] > DAILY_API_CALL_LIMIT:
         logger.warning("Circuit breaker tripped for tenant=%s calls=%d", tenant_id, _daily_api_calls_per_tenant[tenant_id])
         return False
     return True
 
 
-def _check_auth() -> bool:
-    """Timing-safe auth check. Returns True if authorized, False otherwise."""
-    provided = request.headers.get("X-CRE-Secret", "")
-    if not _CRE_SECRET:
-        return False  # No secret configured = reject all (fail-closed)
-    return hmac.compare_digest(provided, _CRE_SECRET)
+class _DailyLimitReached(Exception):
+    """Raised by an analysis when the tenant's circuit breaker trips on a cache miss."""
 
 
-# ─── Injection pattern constants ───
-_INJECTION_PATTERNS = [
-    (re.compile(r'ignore\s+(all\s+)?previous\s+instructions?', re.IGNORECASE), '[filtered]'),
-    (re.compile(r'you\s+are\s+now\s+', re.IGNORECASE), '[filtered] '),
-    (re.compile(r'new\s+instructions?\s*:', re.IGNORECASE), '[filtered]:'),
-    (re.compile(r'system\s*:\s*', re.IGNORECASE), '[filtered]: '),
-    (re.compile(r'<\s*/?\s*system\s*>', re.IGNORECASE), ''),
-    (re.compile(r'-{3,}', re.IGNORECASE), '---'),
-]
+# ── Response cache (in-memory LRU + TTL, per-process) ─────────────────
+# Snapshots change slowly, so repeated polls with an identical prompt reuse the
+# previous assessment instead of paying for another LLM round-trip.
+RESPONSE_CACHE_TTL = int(os.environ.get("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_MAXSIZE = int(os.environ.get("RESPONSE_CACHE_MAXSIZE", "1024"))
+_CACHE_MAX_TEMPERATURE = 0.2  # only near-deterministic calls are worth caching
+# The arb model is a reasoning model that takes no temperature, so its replies
+# are sampled; caching them is opt-in.
+CACHE_ARB_RESPONSES = os.environ.get("CACHE_ARB_RESPONSES", "0") == "1"
+_response_cache: OrderedDict[bytes, tuple[float, dict]] = OrderedDict()
+_cache_stats = {"hits": 0, "misses": 0}
 
 
-def _sanitize_str(value: str, max_len: int = 500) -> str:
-    """Sanitize string inputs before prompt interpolation.
+def _cache_prefix(model: str, system_prompt: str):
+    """sha256 state over the static (model, system prompt) part of a cache key.
 
-    Strips control characters and defangs common prompt injection patterns.
-    Applied to all externally-sourced free-text fields that flow into LLM prompts.
+    Built once per route at import so the multi-KB system prompt is not
+    re-encoded and re-hashed on every request.
     """
-    if not isinstance(value, str):
-        return str(value)[:max_len]
-    # Strip control characters (keep newlines/tabs for readability)
-    cleaned = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f]', '', value)
-    # Defang injection keywords
-    for pattern, replacement in _INJECTION_PATTERNS:
-        cleaned = pattern.sub(replacement, cleaned)
-    return cleaned[:max_len]
+    h = hashlib.sha256()
+    for part in (model, system_prompt):
+        h.update(part.encode())
+        h.update(b"\x00")
+    return h
+
+
+def _cache_key(prefix, prompt: str) -> bytes:
+    h = prefix.copy()
+    h.update(prompt.encode())
+    return h.digest()
+
+
+def _cache_get(key: bytes) -> dict | None:
+    """Return a cached result if present and fresh, else None."""
+    entry = _response_cache.get(key)
+    if entry is not None and time.monotonic() - entry[0] < RESPONSE_CACHE_TTL:
+        _response_cache.move_to_end(key)
+        _cache_stats["hits"] += 1
+        return entry[1]
+    if entry is not None:
+        del _response_cache[key]
+    _cache_stats["misses"] += 1
+    return None
+
+
+def _cache_put(key: bytes, result: dict) -> None:
+    _response_cache[key] = (time.monotonic(), result)
+    _response_cache.move_to_end(key)
+    while len(_response_cache) > RESPONSE_CACHE_MAXSIZE:
+        _response_cache.popitem(last=False)
+
+
+# ── LLM clients (one per process, reused across requests) ─────────────
+# Semaphores cap in-flight calls per provider so bursts queue here instead of
+# tripping provider rate limits. Limits are per worker process.
+ANTHROPIC_MAX_CONCURRENCY = int(os.environ.get("ANTHROPIC_MAX_CONCURRENCY", "8"))
+OPENAI_MAX_CONCURRENCY = int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8"))
+_ANTHROPIC_SEM = asyncio.Semaphore(ANTHROPIC_MAX_CONCURRENCY)
+_OPENAI_SEM = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_anthropic() -> anthropic.AsyncAnthropic:
+    """Shared Anthropic client. Created on first use so a missing key still yields a 503."""
+    return anthropic.AsyncAnthropic(api_key=_ANTHROPIC_KEY)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_openai() -> AsyncOpenAI:
+    """Shared OpenAI client. Created on first use so a missing key still yields a 503."""
+    return AsyncOpenAI(api_key=_OPENAI_KEY)
+
+
+async def _read_json_body() -> dict | None:
+    """Parse the request body with orjson. Returns None if it is not a JSON object."""
+    raw = await request.get_data(cache=False)
+    if not raw:
+        return {}
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _secret_matches(expected: bytes) -> bool:
+    """Constant-time X-CRE-Secret check against a pre-encoded secret.
+
+    Compares bytes so non-ASCII header values fail cleanly instead of raising.
+    """
+    if not expected:
+        return False  # No secret configured = reject all (fail-closed)
+    provided = request.headers.get("X-CRE-Secret")
+    if not provided:
+        return False
+    return hmac.compare_digest(provided.encode(), expected)
+
+
+def _check_auth() -> bool:
+    """Timing-safe auth check. Returns True if authorized, False otherwise."""
+    return _secret_matches(_CRE_SECRET_BYTES)
+
+
+_SYSTEM_BLOCK_RE = re.compile(r'<system>.*?</system>', re.DOTALL | re.IGNORECASE)
+_SYSTEM_OPEN_RE = re.compile(r'<system>', re.IGNORECASE)
 
 
 def _sanitize_agent_output(output: str) -> str:
@@ -119,594 +256,519 @@ def _sanitize_agent_output(output: str) -> str:
     propagate through cross-workflow pipelines (HIGH: cross-agent pipeline fix).
     """
     # Remove leaked system prompt blocks
-    output = re.sub(r'<system>.*?</system>', '[redacted]', output, flags=re.DOTALL | re.IGNORECASE)
+    output = _SYSTEM_BLOCK_RE.sub('[redacted]', output)
     # Strip injection attempts targeting downstream consumers
     for pattern, replacement in _INJECTION_PATTERNS:
         output = pattern.sub(replacement, output)
     return output
 
-_SYSTEM_PROMPT = """\
-You are Orbital Sentinel, an autonomous AI risk analyst for DeFi protocols built on Chainlink staking.
-
-Your task is a structured TWO-PHASE assessment of protocol health.
-
-## PHASE 1 — ATOM EVALUATION
-
-Evaluate each of the four core metrics independently against these thresholds:
-
-1. Pool fill (staking utilization — check BOTH community and operator pools):
-   - ok: all pools fill < 90%
-   - warning: any pool fill 90–99%
-   - critical: any pool fill = 100% (fully saturated, no new staking capacity)
-   - missing: fill data absent
-
-2. Reward runway (days until vault depleted):
-   - ok: runway > 30 days
-   - warning: runway 7–30 days
-   - critical: runway < 7 days
-   - missing: runway data absent
-
-3. Lending utilization (Morpho wstLINK/LINK market):
-   - ok: utilization < 85%
-   - warning: utilization 85–94%
-   - critical: utilization ≥ 95%
-   - missing: utilization data absent or "unavailable"
-
-4. Queue depth (LINK pending in priority queue):
-   - ok: queue < 1,000 LINK
-   - warning: queue 1,000–10,000 LINK
-   - critical: queue > 10,000 LINK
-   - missing: queue data absent or "unavailable"
-
-## PHASE 2 — DETERMINISTIC SYNTHESIS
-
-Combine atom results using these rules (in order of priority):
-- If ANY atom = critical → risk_label = "critical"
-- Else if ANY atom = warning → risk_label = "warning"
-- Else if all atoms = ok → risk_label = "ok"
-- If ≥ 2 atoms = missing → risk_label = "unknown"
-
-Your written assessment must cite the specific atom(s) that drove the label.
-
-## OUTPUT FORMAT
-
-Respond ONLY with valid JSON in exactly this format (no markdown, no extra keys):
-{
-  "assessment": "<1-2 sentence risk summary citing which atoms triggered the label>",
-  "risk_label": "<ok|warning|critical|unknown>",
-  "atom_status": {
-    "pool": "<ok|warning|critical|missing>",
-    "runway": "<ok|warning|critical|missing>",
-    "lending": "<ok|warning|critical|missing>",
-    "queue": "<ok|warning|critical|missing>"
-  },
-  "action_items": ["<concrete action 1>", "<concrete action 2>"],
-  "confidence": <0.0-1.0 float>
-}
-
-Rules:
-- action_items must be specific and actionable, addressing the critical/warning atoms
-- confidence: 0.9-1.0 if all atoms have data, 0.6-0.8 if some atoms are missing
-"""
+
+class _DeltaSanitizer:
+    """Sanitize streamed text over a rolling buffer instead of chunk by chunk.
+
+    A pattern split across two deltas would slip past per-chunk sanitizing, so
+    the tail that could still grow into a match is held back: the last
+    HOLD_WORDS words (every injection pattern spans fewer) and any <system>
+    block that has not been closed yet.
+    """
+
+    HOLD_WORDS = 5
+
+    def __init__(self):
+        self._pending = ""
+
+    def _open_block(self) -> int:
+        """Index of an unterminated <system> tag in the buffer, or -1."""
+        end = 0
+        for m in _SYSTEM_BLOCK_RE.finditer(self._pending):
+            end = m.end()
+        m = _SYSTEM_OPEN_RE.search(self._pending, end)
+        return m.start() if m else -1
+
+    def feed(self, delta: str) -> str:
+        """Add a delta; return the sanitized text that is now safe to forward."""
+        self._pending += delta
+        open_at = self._open_block()
+        safe = self._pending if open_at < 0 else self._pending[:open_at]
+        words = [m.start() for m in re.finditer(r'\S+', safe)]
+        cut = words[-self.HOLD_WORDS] if len(words) >= self.HOLD_WORDS else 0
+        # Never cut through a match that is already complete
+        moved = True
+        while moved and cut:
+            moved = False
+            for pattern in (_SYSTEM_BLOCK_RE, *(p for p, _ in _INJECTION_PATTERNS)):
+                for m in pattern.finditer(safe):
+                    if m.start() < cut < m.end():
+                        cut, moved = m.start(), True
+        out, self._pending = self._pending[:cut], self._pending[cut:]
+        return _sanitize_agent_output(out)
+
+    def flush(self) -> str:
+        """Sanitize and return the rest; an unterminated <system> block is redacted whole."""
+        open_at = self._open_block()
+        rest, self._pending = self._pending, ""
+        if open_at >= 0:
+            return _sanitize_agent_output(rest[:open_at]) + "[redacted]"
+        return _sanitize_agent_output(rest)
+
+
+def _sanitize_agent_result(obj):
+    """Apply _sanitize_agent_output to every string in a structured (tool-use) result."""
+    if isinstance(obj, str):
+        return _sanitize_agent_output(obj)
+    if isinstance(obj, dict):
+        return {k: _sanitize_agent_result(v) for k, v in obj.items()}
+    if isinstance(obj, list):
+        return [_sanitize_agent_result(v) for v in obj]
+    return obj
+
+
+# Opening fence with any language tag (json, JSON, ...), then the body up to the
+# last closing fence: backticks inside the body are kept, prose after it dropped.
+# An unterminated fence keeps everything after the opening line.
+_FENCE_RE = re.compile(r"^```[^\n{\[]*\n?(?:(.*)```|(.*))", re.DOTALL)
+
+
+def _strip_code_fence(text: str) -> str:
+    """Unwrap a ```lang ... ``` fenced reply. Text without a leading fence is returned as-is."""
+    m = _FENCE_RE.match(text)
+    if not m:
+        return text
+    return (m.group(1) if m.group(1) is not None else m.group(2)).strip()
 
 
-def _format_prompt(data: dict) -> str:
-    overall_risk = data.get("overallRisk", "unknown")
-    alerts = data.get("alerts", [])
-    staking = data.get("staking", {})
-    rewards = data.get("rewards", {})
-    morpho = data.get("morpho", {})
-    queue = data.get("queue", {})
-
-    community = staking.get("community", {})
-    operator = staking.get("operator", {})
-
-    morpho_util = morpho.get("utilization")
-    util_str = f"{morpho_util:.1f}%" if morpho_util is not None else "unavailable"
-    tvl = morpho.get("vaultTvlUsd")
-    tvl_str = f"${tvl:,.0f}" if tvl is not None else "unavailable"
-    q = queue.get("queueLink")
-    q_str = f"{q:,.0f} tokens" if q is not None else "unavailable"
-
-    lines = [
-        f"Timestamp: {data.get('timestamp', 'unknown')}",
-        f"Overall Risk: {overall_risk.upper()}",
-        "",
-        "## Staking Pools",
-        f"Pool A: {community.get('staked', '?')} / {community.get('cap', '?')} ({community.get('fillPct', 0):.1f}% full) — {community.get('risk', '?')}",
-        f"Pool B: {operator.get('staked', '?')} / {operator.get('cap', '?')} ({operator.get('fillPct', 0):.1f}% full) — {operator.get('risk', '?')}",
-        "",
-        "## Reward Vault",
-        f"Balance: {rewards.get('vaultBalance', '?')} tokens",
-        f"Emission: {rewards.get('emissionPerDay', '?')} tokens/day",
-        f"Runway: {rewards.get('runwayDays', 0):.0f} days — {rewards.get('risk', '?')}",
-        "",
-        "## Lending Market",
-        f"Utilization: {util_str} — {morpho.get('risk', '?')}",
-        f"Vault TVL: {tvl_str}",
-        "",
-        "## Priority Queue",
-        f"Queue Depth: {q_str} — {queue.get('risk', '?')}",
-        "",
-    ]
-
-    if alerts:
-        lines.append("## Active Alerts")
-        for a in alerts:
-            lines.append(f"- {_sanitize_str(str(a), 200)}")
-    else:
-        lines.append("No active alerts.")
-
-    return "\n".join(lines)
+class _AIResponseError(ValueError):
+    """The model replied, but not with a complete, usable result."""
+
+
+def _analysis_error(exc: BaseException, name: str) -> dict:
+    """Map a failed analysis to the same error body the single-provider routes return."""
+    if isinstance(exc, (orjson.JSONDecodeError, _AIResponseError)):
+        return {"error": "AI response parse error"}
+    if isinstance(exc, _DailyLimitReached):
+        return {"error": "daily API call limit reached"}
+    logger.error("%s analyze failed", name, exc_info=exc)
+    return {"error": "internal analysis error"}
+
+
+def _ndjson(obj) -> bytes:
+    return orjson.dumps(obj) + b"\n"
+
+
+# Upper bound on a streamed analysis, semaphore wait included. Quart's own
+# RESPONSE_TIMEOUT is disabled on NDJSON responses because it drops the
+# connection without a final line; this one ends the stream with an error.
+STREAM_TIMEOUT_SECONDS = float(os.environ.get("STREAM_TIMEOUT_SECONDS", "300"))
+
+
+async def _stream_analysis(analysis, data: dict, name: str):
+    """Run an analysis coroutine and yield NDJSON lines for a streaming response.
+
+    Text deltas are forwarded as {"delta": ...} while the model writes; the last
+    line is {"result": ...} (parsed, sanitized, cached) or {"error": ...}, also
+    when STREAM_TIMEOUT_SECONDS runs out. Deltas go through _DeltaSanitizer, so
+    a few words of text trail the model.
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.ensure_future(analysis(data, on_delta=queue.put_nowait))
+    task.add_done_callback(lambda _: queue.put_nowait(None))
+    sanitizer = _DeltaSanitizer()
+    deadline = time.monotonic() + STREAM_TIMEOUT_SECONDS
+    try:
+        while True:
+            try:
+                delta = await asyncio.wait_for(queue.get(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                task.cancel()
+                logger.warning("%s stream timed out after %.0fs", name, STREAM_TIMEOUT_SECONDS)
+                if text := sanitizer.flush():
+                    yield _ndjson({"delta": text})
+                yield _ndjson({"error": "analysis timed out"})
+                return
+            if delta is None:
+                break
+            if text := sanitizer.feed(delta):
+                yield _ndjson({"delta": text})
+        if text := sanitizer.flush():
+            yield _ndjson({"delta": text})
+        exc = task.exception()
+        yield _ndjson(_analysis_error(exc, name) if exc else {"result": task.result()})
+    finally:
+        task.cancel()  # client went away mid-stream
+
+
+def _ndjson_response(analysis, data: dict, name: str) -> Response:
+    response = Response(_stream_analysis(analysis, data, name), mimetype="application/x-ndjson")
+    response.timeout = None  # bounded by STREAM_TIMEOUT_SECONDS instead
+    return response
+
+
+_TREASURY_MODEL = "claude-haiku-4-5-20251001"
+_TREASURY_MAX_TOKENS = 200  # risk_label/atom_status are precomputed; the model writes the narrative
+_TREASURY_TEMPERATURE = 0  # greedy decoding: reproducible JSON and repeatable cache hits
+_TREASURY_CACHE_PREFIX = _cache_prefix(_TREASURY_MODEL, _SYSTEM_PROMPT)
+# cache_control marks the static prefix (tool schema + system prompt) for
+# Anthropic prompt caching. Today it is a no-op: that prefix is ~1k tokens,
+# below Haiku's minimum cacheable length (4,096 tokens for Haiku 4.5), so the
+# API processes it in full every call. It takes effect only if the prefix grows
+# past that minimum.
+_TREASURY_SYSTEM = [{"type": "text", "text": _SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}}]
+
+
+def _tool_input(message) -> dict:
+    """The forced risk_assessment tool call's input from a Claude message.
+
+    Raises _AIResponseError if the reply was cut off by max_tokens or lacks a
+    required field, so a truncated assessment is never returned or cached.
+    """
+    if message.stop_reason == "max_tokens":
+        raise _AIResponseError("tool call truncated at max_tokens")
+    for block in message.content:
+        if block.type == "tool_use":
+            missing = [k for k in _TREASURY_TOOL["input_schema"]["required"] if k not in block.input]
+            if missing:
+                raise _AIResponseError(f"tool call missing {', '.join(missing)}")
+            return _sanitize_agent_result(block.input)
+    raise _AIResponseError("no tool_use block in response")
+
+
+async def _treasury_analysis(data: dict, tenant_id: str = "default", on_delta=None) -> dict:
+    """Treasury risk assessment via Claude. Raises on API errors or an unusable tool call.
+
+    Cache hits are free; a miss is charged to tenant_id's circuit breaker and
+    raises _DailyLimitReached once it trips. With on_delta, the reply is
+    streamed and each partial-JSON chunk is passed to it.
+    risk_label and atom_status in the result always come from _compute_atoms.
+    """
+    atoms = _compute_atoms(data)
+    prompt = _format_prompt(data) + _format_atoms(atoms)
+    cache_key = None
+    if _TREASURY_TEMPERATURE <= _CACHE_MAX_TEMPERATURE:
+        cache_key = _cache_key(_TREASURY_CACHE_PREFIX, prompt)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
+    if not _check_circuit_breaker(tenant_id):
+        raise _DailyLimitReached(tenant_id)
+
+    params = dict(
+        model=_TREASURY_MODEL,
+        max_tokens=_TREASURY_MAX_TOKENS,
+        temperature=_TREASURY_TEMPERATURE,
+        system=_TREASURY_SYSTEM,
+        messages=[{"role": "user", "content": prompt}],
+        tools=[_TREASURY_TOOL],
+        tool_choice={"type": "tool", "name": _TREASURY_TOOL["name"]},
+    )
+    async with _ANTHROPIC_SEM:
+        if on_delta is None:
+            response = await _get_anthropic().messages.create(**params)
+        else:
+            async with _get_anthropic().messages.stream(**params) as stream:
+                async for event in stream:
+                    if event.type == "content_block_delta" and event.delta.type == "input_json_delta":
+                        on_delta(event.delta.partial_json)
+                response = await stream.get_final_message()
+    result = _tool_input(response)
+    result.update(atoms)
+    if cache_key is not None:
+        _cache_put(cache_key, result)
+    logger.info("AI assess | risk=%s confidence=%.2f", result.get("risk_label"), result.get("confidence", 0))
+    return result
 
 
 @cre_bp.route("/api/cre/analyze", methods=["POST"])
-def analyze():
+async def analyze():
     if not _check_auth():
         return jsonify({"error": "unauthorized"}), 401
     if not _rate_limit_check():
         return jsonify({"error": "rate limited"}), 429
 
-    tenant_id = request.headers.get("X-Tenant-Id", "default")
-    if not _check_circuit_breaker(tenant_id):
-        return jsonify({"error": "daily API call limit reached"}), 429
+    data = await _read_json_body()
+    if data is None:
+        return jsonify({"error": "bad json"}), 400
+    # Atoms-only mode: no LLM call, so it does not count against the API budget
+    if request.args.get("no_llm") == "1":
+        return jsonify(_compute_atoms(data)), 200
 
-    data = request.get_json(force=True, silent=True) or {}
-    api_key = os.environ.get("ANTHROPIC_API_KEY", "")
-    if not api_key:
+    if not _ANTHROPIC_KEY:
         return jsonify({"error": "ANTHROPIC_API_KEY not set"}), 503
 
+    tenant_id = request.headers.get("X-Tenant-Id", "default")
+    if request.args.get("stream") == "1":
+        analysis = functools.partial(_treasury_analysis, tenant_id=tenant_id)
+        return _ndjson_response(analysis, data, "treasury")
     try:
-        import anthropic
-        client = anthropic.Anthropic(api_key=api_key)
-        response = client.messages.create(
-            model="claude-haiku-4-5-20251001",
-            max_tokens=512,
-            temperature=0.1,
-            system=_SYSTEM_PROMPT,
-            messages=[{"role": "user", "content": _format_prompt(data)}],
-        )
-        text = _sanitize_agent_output(response.content[0].text.strip())
-        if text.startswith("```"):
-            text = text.split("```")[1]
-            if text.startswith("json"):
-                text = text[4:]
-            text = text.strip()
-        result = json.loads(text)
-        logger.info("AI assess | risk=%s confidence=%.2f", result.get("risk_label"), result.get("confidence", 0))
-        return jsonify(result), 200
-    except json.JSONDecodeError:
+        return jsonify(await _treasury_analysis(data, tenant_id)), 200
+    except _DailyLimitReached:
+        return jsonify({"error": "daily API call limit reached"}), 429
+    except _AIResponseError:
+        logger.warning("analyze: unusable AI response", exc_info=True)
         return jsonify({"error": "AI response parse error"}), 500
     except Exception:
         logger.exception("analyze failed")
         return jsonify({"error": "internal analysis error"}), 500
 
 
-_ARB_SYSTEM_PROMPT = """\
-You are Orbital Sentinel, an autonomous AI analyst for the stLINK Arb Vault — a DeFi vault that captures the stLINK premium on Curve's stLINK/LINK StableSwap pool.
-
-The vault works by: selling stLINK → LINK on Curve (when stLINK trades at a premium), then depositing LINK to the Priority Pool at 1:1 to get new stLINK, pocketing the premium.
+# ─── Treasury batch analysis (Anthropic Message Batches API, ~50% cheaper) ───
+# Batches finish asynchronously (usually minutes, at most 24h). The POST polls
+# with exponential backoff for up to BATCH_WAIT_SECONDS; if the batch is still
+# running it returns 202 with the batch id to poll via GET. The wait must stay
+# well under the ~100 s Cloudflare edge timeout in front of the sentinel tunnel,
+# or the caller gets a 524 and never learns the batch id.
+MAX_BATCH_SNAPSHOTS = int(os.environ.get("MAX_BATCH_SNAPSHOTS", "100"))
+BATCH_WAIT_SECONDS = float(os.environ.get("BATCH_WAIT_SECONDS", "60"))
 
-## YOUR TASK
+# Each request's computed atoms ride along in its custom_id ("snap-<i>-<codes>",
+# one letter per atom), so the GET route can merge them without keeping state.
+_ATOM_KEYS = ("pool", "runway", "lending", "queue")
+_STATUS_CODES = {"ok": "o", "warning": "w", "critical": "c", "missing": "m"}
+_CODE_STATUSES = {v: k for k, v in _STATUS_CODES.items()}
 
-Analyze the current market conditions and recommend an action.
 
-## INPUT DATA
+def _batch_custom_id(index: int, atoms: dict) -> str:
+    codes = "".join(_STATUS_CODES[atoms["atom_status"][k]] for k in _ATOM_KEYS)
+    return f"snap-{index}-{codes}"
 
-You will receive:
-- **Pool state**: Curve pool LINK and stLINK balances, imbalance ratio
-- **Premium quotes**: Simulated swap outputs at different sizes (100, 500, 1000, 5000 stLINK)
-- **Priority Pool**: Status (OPEN/DRAINING/CLOSED) and queued LINK
-- **Vault state**: stLINK held, LINK queued, cycle count, capital assets (if vault deployed)
-- **Signal**: Deterministic signal from math (execute/wait/unprofitable/pool_closed/no_stlink)
 
-## ANALYSIS FRAMEWORK
+def _batch_atoms(codes: str) -> dict | None:
+    """Atoms decoded from a custom_id suffix, or None if it carries none."""
+    if len(codes) != len(_ATOM_KEYS) or not set(codes) <= _CODE_STATUSES.keys():
+        return None
+    atom_status = {k: _CODE_STATUSES[c] for k, c in zip(_ATOM_KEYS, codes)}
+    return {"risk_label": _risk_label(atom_status), "atom_status": atom_status}
 
-1. **Premium quality**: Are premiums consistent across swap sizes? Larger swaps with lower premium = pool will move fast. Assess slippage risk.
-2. **Timing**: Is the pool imbalance growing or stable? High LINK/stLINK ratio = more premium potential.
-3. **Size recommendation**: Based on premium decay across quote sizes, what's the optimal swap amount?
-4. **Priority Pool health**: If queue is very large, claimed stLINK may take longer to convert back.
-5. **Risk factors**: Any red flags? (e.g., pool nearly balanced = premium could vanish, PP closed, very low premium)
-
-## OUTPUT FORMAT
-
-Respond ONLY with valid JSON (no markdown, no extra keys):
-{
-  "recommendation": "<execute|wait|skip>",
-  "assessment": "<2-3 sentence analysis of current conditions>",
-  "optimal_swap_size": "<recommended stLINK amount to swap, e.g. '1000'>",
-  "risk_factors": ["<risk 1>", "<risk 2>"],
-  "confidence": <0.0-1.0 float>,
-  "reasoning": "<1 sentence explaining the recommendation>"
-}
-
-Rules:
-- recommendation must agree with the math signal unless you have strong reason to override
-- If signal is "execute" but premium is very thin (<5 bps), recommend "wait"
-- If signal is "wait" but pool conditions suggest premium is growing, note that
-- confidence: 0.9+ when data is complete and clear, 0.5-0.7 when conditions are ambiguous
-"""
 
+def _treasury_batch_request(index: int, snapshot) -> dict:
+    snapshot = snapshot if isinstance(snapshot, dict) else {}
+    atoms = _compute_atoms(snapshot)
+    return {
+        "custom_id": _batch_custom_id(index, atoms),
+        "params": {
+            "model": _TREASURY_MODEL,
+            "max_tokens": _TREASURY_MAX_TOKENS,
+            "temperature": _TREASURY_TEMPERATURE,
+            "system": _TREASURY_SYSTEM,
+            "messages": [{"role": "user", "content": _format_prompt(snapshot) + _format_atoms(atoms)}],
+            "tools": [_TREASURY_TOOL],
+            "tool_choice": {"type": "tool", "name": _TREASURY_TOOL["name"]},
+        },
+    }
 
-def _format_arb_prompt(data: dict) -> str:
-    signal = _sanitize_str(data.get("signal", "unknown"))
-    pool = data.get("poolState", {})
-    quotes = data.get("premiumQuotes", [])
-    pp_status = data.get("priorityPoolStatus", -1)
-    pp_queued = data.get("priorityPoolQueued", "0")
-    vault = data.get("vaultState")
-
-    pp_status_str = {0: "OPEN", 1: "DRAINING", 2: "CLOSED"}.get(pp_status, f"UNKNOWN({pp_status})")
-
-    link_balance = _sanitize_str(str(pool.get('linkBalanceFormatted', '?')))
-    stlink_balance = _sanitize_str(str(pool.get('stLINKBalanceFormatted', '?')))
-
-    lines = [
-        f"Deterministic signal: {signal.upper()}",
-        "",
-        "## Curve Pool State",
-        f"LINK balance: {link_balance}",
-        f"stLINK balance: {stlink_balance}",
-        f"Imbalance ratio (LINK/stLINK): {pool.get('imbalanceRatio', 0):.4f}",
-        "",
-        "## Premium Quotes (stLINK \u2192 LINK)",
-    ]
-
-    for q in quotes:
-        amt_in = _sanitize_str(str(q.get('amountInFormatted', '?')))
-        amt_out = _sanitize_str(str(q.get('amountOutFormatted', '?')))
-        premium_bps = int(q.get('premiumBps', 0)) if isinstance(q.get('premiumBps', 0), (int, float)) else 0
-        lines.append(f"  {amt_in} stLINK \u2192 {amt_out} LINK ({premium_bps} bps)")
-
-    lines.extend([
-        "",
-        "## Priority Pool",
-        f"Status: {pp_status_str}",
-        f"Queued: {formatUnits_py(pp_queued)} LINK",
-    ])
-
-    if vault:
-        cycle_count = _sanitize_str(str(vault.get('cycleCount', '0')), max_len=20)
-        min_profit = _sanitize_str(str(vault.get('minProfitBps', '?')), max_len=20)
-        lines.extend([
-            "",
-            "## Vault State",
-            f"stLINK held: {formatUnits_py(vault.get('totalStLINKHeld', '0'))}",
-            f"LINK queued: {formatUnits_py(vault.get('totalLINKQueued', '0'))}",
-            f"Cycle count: {cycle_count}",
-            f"Capital assets: {formatUnits_py(vault.get('totalCapitalAssets', '0'))} LINK",
-            f"Min profit threshold: {min_profit} bps",
-        ])
-
-    return "\n".join(lines)
-
-
-def formatUnits_py(value_str: str, decimals: int = 18) -> str:
-    try:
-        val = int(value_str)
-        whole = val // (10 ** decimals)
-        frac = val % (10 ** decimals)
-        return f"{whole:,}.{str(frac).zfill(decimals)[:2]}"
-    except (ValueError, TypeError):
-        return str(value_str)
 
+async def _collect_batch_results(batch_id: str) -> dict:
+    """Map snapshot index -> parsed assessment (or error entry) for an ended batch.
 
-@cre_bp.route("/api/cre/analyze-arb", methods=["POST"])
-def analyze_arb():
+    risk_label and atom_status come from _compute_atoms, as on /api/cre/analyze.
+    """
+    results = {}
+    async for entry in await _get_anthropic().messages.batches.results(batch_id):
+        index, _, codes = entry.custom_id.removeprefix("snap-").partition("-")
+        if entry.result.type != "succeeded":
+            results[index] = {"error": f"batch request {entry.result.type}"}
+            continue
+        try:
+            result = _tool_input(entry.result.message)
+        except _AIResponseError:
+            results[index] = {"error": "AI response parse error"}
+            continue
+        atoms = _batch_atoms(codes)
+        if atoms is not None:
+            result.update(atoms)
+        results[index] = result
+    return results
+
+
+@cre_bp.route("/api/cre/analyze-batch", methods=["POST"])
+async def analyze_batch():
     if not _check_auth():
         return jsonify({"error": "unauthorized"}), 401
     if not _rate_limit_check():
         return jsonify({"error": "rate limited"}), 429
 
+    data = await _read_json_body()
+    if data is None:
+        return jsonify({"error": "bad json"}), 400
+    snapshots = data.get("snapshots")
+    if not isinstance(snapshots, list) or not snapshots:
+        return jsonify({"error": "snapshots must be a non-empty list"}), 400
+    if len(snapshots) > MAX_BATCH_SNAPSHOTS:
+        return jsonify({"error": f"at most {MAX_BATCH_SNAPSHOTS} snapshots per batch"}), 400
+
     tenant_id = request.headers.get("X-Tenant-Id", "default")
-    if not _check_circuit_breaker(tenant_id):
+    if not _check_circuit_breaker(tenant_id, calls=len(snapshots)):
         return jsonify({"error": "daily API call limit reached"}), 429
 
-    data = request.get_json(force=True, silent=True) or {}
-    api_key = os.environ.get("OPENAI_API_KEY", "")
-    if not api_key:
-        return jsonify({"error": "OPENAI_API_KEY not set"}), 503
+    if not _ANTHROPIC_KEY:
+        return jsonify({"error": "ANTHROPIC_API_KEY not set"}), 503
 
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
-        response = client.responses.create(
-            model="gpt-5.3-codex",
-            instructions=_ARB_SYSTEM_PROMPT,
-            input=_format_arb_prompt(data),
-        )
-        text = _sanitize_agent_output(response.output_text.strip())
-        if text.startswith("```"):
-            text = text.split("```")[1]
-            if text.startswith("json"):
-                text = text[4:]
-            text = text.strip()
-        result = json.loads(text)
-        logger.info("Arb AI assess | rec=%s confidence=%.2f", result.get("recommendation"), result.get("confidence", 0))
-        return jsonify(result), 200
-    except json.JSONDecodeError:
-        return jsonify({"error": "AI response parse error"}), 500
+        client = _get_anthropic()
+        async with _ANTHROPIC_SEM:
+            batch = await client.messages.batches.create(
+                requests=[_treasury_batch_request(i, snap) for i, snap in enumerate(snapshots)],
+            )
+        deadline = time.monotonic() + BATCH_WAIT_SECONDS
+        delay = 1.0
+        while batch.processing_status != "ended" and time.monotonic() + delay <= deadline:
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30.0)
+            batch = await client.messages.batches.retrieve(batch.id)
+        if batch.processing_status != "ended":
+            return jsonify({"batch_id": batch.id, "status": batch.processing_status}), 202
+        results = await _collect_batch_results(batch.id)
+        logger.info("Batch AI assess | batch=%s snapshots=%d", batch.id, len(results))
+        return jsonify({"batch_id": batch.id, "status": batch.processing_status, "results": results}), 200
     except Exception:
-        logger.exception("arb analyze failed")
+        logger.exception("batch analyze failed")
         return jsonify({"error": "internal analysis error"}), 500
 
 
-_COMPOSITE_SYSTEM_PROMPT = """\
-You are Orbital Sentinel, an autonomous AI analyst with FULL ECOSYSTEM VISIBILITY across 6 Chainlink CRE workflows monitoring the stake.link protocol.
+@cre_bp.route("/api/cre/analyze-batch/<batch_id>", methods=["GET"])
+async def analyze_batch_status(batch_id: str):
+    if not _check_auth():
+        return jsonify({"error": "unauthorized"}), 401
+    if not _rate_limit_check():
+        return jsonify({"error": "rate limited"}), 429
+
+    if not _ANTHROPIC_KEY:
+        return jsonify({"error": "ANTHROPIC_API_KEY not set"}), 503
 
-You are analyzing an stLINK arbitrage opportunity on Curve's stLINK/LINK StableSwap pool. Unlike a standard arb analysis that only sees pool data, you have access to cross-workflow intelligence from the entire stake.link ecosystem, collected in a unified CRE cycle.
+    try:
+        batch = await _get_anthropic().messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return jsonify({"batch_id": batch.id, "status": batch.processing_status}), 202
+        results = await _collect_batch_results(batch.id)
+        return jsonify({"batch_id": batch.id, "status": batch.processing_status, "results": results}), 200
+    except Exception:
+        logger.exception("batch status failed")
+        return jsonify({"error": "internal analysis error"}), 500
 
-The arb mechanism: sell stLINK for LINK on Curve (when stLINK trades at a premium), then deposit LINK to the Priority Pool at 1:1 to get new stLINK, pocketing the premium.
 
-## CROSS-WORKFLOW SIGNAL INTERPRETATION
+_ARB_MODEL = "gpt-5.3-codex"
+# The arb JSON is ~200 tokens, but on reasoning models max_output_tokens also
+# covers reasoning tokens. Effort is pinned low so reasoning cannot eat the
+# whole budget, and the cap still leaves headroom for it.
+_ARB_MAX_OUTPUT_TOKENS = 2048
+_ARB_REASONING = {"effort": "low"}
+# instructions are kept byte-identical across calls (never templated) so that
+# OpenAI's automatic prompt caching could reuse them. That only applies to
+# prompts of 1,024+ tokens, which the arb prompt is currently below.
+_ARB_CACHE_PREFIX = _cache_prefix(_ARB_MODEL, _ARB_SYSTEM_PROMPT)
 
-Each ecosystem signal affects the arb decision differently:
 
-1. **Price Feeds (LINK/USD, ETH/USD)**: USD-denominated profitability. A 17 bps stLINK premium means ~$0.015/LINK at $9 LINK, but if LINK is in a sharp decline, the arb profit could be wiped out by price movement during the cycle time (deposit LINK, wait for stLINK mint, sell stLINK).
+async def _arb_analysis(data: dict, tenant_id: str = "default", on_delta=None) -> dict:
+    """Arb vault market analysis via OpenAI. Raises on API errors or unparseable output.
 
-2. **Treasury Risk (staking pools, reward runway, queue depth)**: Structural signals.
-   - Community pool at 100% = no new staking capacity = excess demand for stLINK = premium likely persists or grows (BULLISH for arb)
-   - Large Priority Pool queue = slow capital recycling = longer time between arb cycles (CAUTION: capital efficiency drops)
-   - Low reward runway = potential staking reward reduction = could reduce stLINK demand long-term
+    A reply cut short by max_output_tokens raises _AIResponseError and is not cached.
 
-3. **Morpho Vault Health (wstLINK/LINK lending)**: Supply pressure signal.
-   - High utilization (>85%) = wstLINK locked as collateral = less stLINK available on open market = supports premium
-   - Low utilization = more wstLINK could be unwrapped and sold, compressing the premium
+    Results are cached only with CACHE_ARB_RESPONSES=1; an uncached call is
+    charged to tenant_id's circuit breaker and raises _DailyLimitReached once it
+    trips. With on_delta, the reply is streamed and each text chunk is passed to it.
+    """
+    prompt = _format_arb_prompt(data)
+    cache_key = None
+    if CACHE_ARB_RESPONSES:
+        cache_key = _cache_key(_ARB_CACHE_PREFIX, prompt)
+        cached = _cache_get(cache_key)
+        if cached is not None:
+            return cached
+    if not _check_circuit_breaker(tenant_id):
+        raise _DailyLimitReached(tenant_id)
+
+    params = dict(
+        model=_ARB_MODEL,
+        instructions=_ARB_SYSTEM_PROMPT,
+        input=prompt,
+        max_output_tokens=_ARB_MAX_OUTPUT_TOKENS,
+        reasoning=_ARB_REASONING,
+        text=_ARB_TEXT_FORMAT,
+    )
+    async with _OPENAI_SEM:
+        if on_delta is None:
+            response = await _get_openai().responses.create(**params)
+        else:
+            async with _get_openai().responses.stream(**params) as stream:
+                async for event in stream:
+                    if event.type == "response.output_text.delta":
+                        on_delta(event.delta)
+                response = await stream.get_final_response()
+    if response.status == "incomplete":
+        reason = getattr(response.incomplete_details, "reason", None)
+        raise _AIResponseError(f"arb response incomplete: {reason}")
+    result = _sanitize_agent_result(orjson.loads(response.output_text))
+    if cache_key is not None:
+        _cache_put(cache_key, result)
+    logger.info("Arb AI assess | rec=%s confidence=%.2f", result.get("recommendation"), result.get("confidence", 0))
+    return result
 
-4. **CCIP Lane Health (cross-chain bridges)**: Flow disruption signal.
-   - Degraded lanes = cross-chain LINK movement restricted = could trap liquidity, affecting Curve pool dynamics
-   - All lanes OK = normal cross-chain flows, no disruption to expect
 
-5. **Curve Pool (detailed composition, gauge, TVL)**: Market structure.
-   - Pool imbalance % and direction = premium sustainability
-   - Gauge rewards = incentive for LPs to rebalance (active rewards attract rebalancing liquidity)
-   - TVL = depth available for swaps without excessive slippage
+@cre_bp.route("/api/cre/analyze-arb", methods=["POST"])
+async def analyze_arb():
+    if not _check_auth():
+        return jsonify({"error": "unauthorized"}), 401
+    if not _rate_limit_check():
+        return jsonify({"error": "rate limited"}), 429
 
-## YOUR TASK
+    data = await _read_json_body()
+    if data is None:
+        return jsonify({"error": "bad json"}), 400
+    if not _OPENAI_KEY:
+        return jsonify({"error": "OPENAI_API_KEY not set"}), 503
 
-Synthesize ALL cross-workflow signals into a unified arb recommendation. Your analysis must explicitly reference how each ecosystem signal influenced your decision. Do not ignore any signal.
+    tenant_id = request.headers.get("X-Tenant-Id", "default")
+    if request.args.get("stream") == "1":
+        analysis = functools.partial(_arb_analysis, tenant_id=tenant_id)
+        return _ndjson_response(analysis, data, "arb")
+    try:
+        return jsonify(await _arb_analysis(data, tenant_id)), 200
+    except _DailyLimitReached:
+        return jsonify({"error": "daily API call limit reached"}), 429
+    except (orjson.JSONDecodeError, _AIResponseError):
+        return jsonify({"error": "AI response parse error"}), 500
+    except Exception:
+        logger.exception("arb analyze failed")
+        return jsonify({"error": "internal analysis error"}), 500
 
-## OUTPUT FORMAT
 
-Respond ONLY with valid JSON (no markdown, no extra keys):
-{
-  "recommendation": "<execute|wait|skip>",
-  "composite_risk": "<ok|warning|critical>",
-  "assessment": "<3-4 sentence analysis integrating ALL cross-workflow signals>",
-  "optimal_swap_size": "<recommended stLINK amount>",
-  "ecosystem_factors": {
-    "price_impact": "<how LINK/USD price affects this arb>",
-    "treasury_impact": "<how staking pool state affects premium persistence>",
-    "morpho_impact": "<how lending utilization affects stLINK supply>",
-    "ccip_impact": "<how bridge status affects liquidity flows>",
-    "curve_impact": "<how pool structure affects execution>"
-  },
-  "risk_factors": ["<risk 1>", "<risk 2>", "<risk 3>"],
-  "confidence": <0.0-1.0>,
-  "reasoning": "<1-2 sentence summary of why this recommendation differs from or agrees with the isolated LAA signal>"
-}
+@cre_bp.route("/api/cre/analyze-both", methods=["POST"])
+async def analyze_both():
+    """Treasury (Anthropic) and arb (OpenAI) assessments for one moment, fetched concurrently.
 
-Rules:
-- composite_risk reflects the OVERALL ecosystem health, not just the arb opportunity
-- recommendation can DISAGREE with the isolated LAA signal when ecosystem data warrants it
-- If the isolated signal is "execute" but ecosystem signals show stress (e.g., LINK price dropping + high Morpho util + degraded CCIP), recommend "wait"
-- If the isolated signal is "wait" but ecosystem signals are strongly supportive (100% pool fill + healthy Morpho + stable prices), consider upgrading to "execute"
-- confidence: 0.9+ when all workflows provided data, 0.6-0.8 when some signals are missing
-- Every field in ecosystem_factors must reference specific numbers from the input data
-"""
+    Each half is charged to the circuit breaker only when it misses the cache.
+    """
+    if not _check_auth():
+        return jsonify({"error": "unauthorized"}), 401
+    if not _rate_limit_check():
+        return jsonify({"error": "rate limited"}), 429
 
+    data = await _read_json_body()
+    if data is None:
+        return jsonify({"error": "bad json"}), 400
+    treasury_data = data.get("treasury", {})
+    arb_data = data.get("arb", {})
+    if not isinstance(treasury_data, dict) or not isinstance(arb_data, dict):
+        return jsonify({"error": "treasury and arb must be objects"}), 400
+    if not _ANTHROPIC_KEY:
+        return jsonify({"error": "ANTHROPIC_API_KEY not set"}), 503
+    if not _OPENAI_KEY:
+        return jsonify({"error": "OPENAI_API_KEY not set"}), 503
 
-def _format_composite_prompt(data: dict) -> str:
-    laa = data.get("laa", {})
-    feeds = data.get("feeds", {})
-    treasury = data.get("treasury", {})
-    morpho = data.get("morpho", {})
-    ccip = data.get("ccip", {})
-    curve = data.get("curve", {})
-
-    signal = _sanitize_str(laa.get("signal", "unknown"))
-    pool = laa.get("poolState", {})
-    quotes = laa.get("premiumQuotes", [])
-    pp_status = laa.get("priorityPoolStatus", -1)
-    pp_queued = laa.get("priorityPoolQueued", "0")
-    vault = laa.get("vaultState")
-
-    pp_status_str = {0: "OPEN", 1: "DRAINING", 2: "CLOSED"}.get(pp_status, f"UNKNOWN({pp_status})")
-
-    link_balance = _sanitize_str(str(pool.get('linkBalanceFormatted', '?')))
-    stlink_balance = _sanitize_str(str(pool.get('stLINKBalanceFormatted', '?')))
-
-    lines = [
-        f"Isolated LAA signal: {signal.upper()}",
-        "",
-        "=" * 50,
-        "WORKFLOW 1: LAA (LINK AI Arbitrage)",
-        "=" * 50,
-        "",
-        "## Curve Pool State (from LAA)",
-        f"LINK balance: {link_balance}",
-        f"stLINK balance: {stlink_balance}",
-        f"Imbalance ratio (LINK/stLINK): {pool.get('imbalanceRatio', 0):.4f}",
-        "",
-        "## Premium Quotes (stLINK to LINK)",
-    ]
-
-    for q in quotes:
-        amt_in = _sanitize_str(str(q.get('amountInFormatted', '?')))
-        amt_out = _sanitize_str(str(q.get('amountOutFormatted', '?')))
-        premium_bps = int(q.get('premiumBps', 0)) if isinstance(q.get('premiumBps', 0), (int, float)) else 0
-        lines.append(f"  {amt_in} stLINK -> {amt_out} LINK ({premium_bps} bps)")
-
-    lines.extend([
-        "",
-        "## Priority Pool (from LAA)",
-        f"Status: {pp_status_str}",
-        f"Queued: {formatUnits_py(pp_queued)} LINK",
-    ])
-
-    if vault:
-        cycle_count = _sanitize_str(str(vault.get('cycleCount', '0')), max_len=20)
-        min_profit = _sanitize_str(str(vault.get('minProfitBps', '?')), max_len=20)
-        lines.extend([
-            "",
-            "## Vault State (from LAA)",
-            f"stLINK held: {formatUnits_py(vault.get('totalStLINKHeld', '0'))}",
-            f"LINK queued: {formatUnits_py(vault.get('totalLINKQueued', '0'))}",
-            f"Cycle count: {cycle_count}",
-            f"Capital assets: {formatUnits_py(vault.get('totalCapitalAssets', '0'))} LINK",
-            f"Min profit threshold: {min_profit} bps",
-        ])
-
-    # Cross-workflow context: Price Feeds
-    lines.extend([
-        "",
-        "=" * 50,
-        "WORKFLOW 2: PRICE FEEDS (Chainlink Data Feeds)",
-        "=" * 50,
-    ])
-    monitor = feeds.get("monitor", {})
-    if monitor:
-        depeg_status = _sanitize_str(str(monitor.get('depegStatus', '?')), max_len=20)
-        lines.extend([
-            f"LINK/USD: ${monitor.get('linkUsd', '?')}",
-            f"ETH/USD: ${monitor.get('ethUsd', '?')}",
-            f"stLINK/LINK price ratio: {monitor.get('stlinkLinkPriceRatio', '?')}",
-            f"Depeg status: {depeg_status} ({monitor.get('depegBps', '?')} bps from parity)",
-        ])
-    else:
-        lines.append("No price feed data available.")
-
-    # Cross-workflow context: Treasury Risk
-    lines.extend([
-        "",
-        "=" * 50,
-        "WORKFLOW 3: TREASURY RISK (Staking Health)",
-        "=" * 50,
-    ])
-    staking = treasury.get("staking", {})
-    community = staking.get("community", {})
-    operator = staking.get("operator", {})
-    rewards = treasury.get("rewards", {})
-    queue = treasury.get("queue", {})
-    if staking:
-        community_risk = _sanitize_str(str(community.get('risk', '?')), max_len=20)
-        operator_risk = _sanitize_str(str(operator.get('risk', '?')), max_len=20)
-        rewards_risk = _sanitize_str(str(rewards.get('risk', '?')), max_len=20)
-        queue_risk = _sanitize_str(str(queue.get('risk', '?')), max_len=20)
-        overall_treasury_risk = _sanitize_str(str(treasury.get('overallRisk', '?')), max_len=20)
-        lines.extend([
-            f"Community Pool: {community.get('staked', '?')} / {community.get('cap', '?')} ({community.get('fillPct', 0):.1f}% full) [{community_risk}]",
-            f"Operator Pool: {operator.get('staked', '?')} / {operator.get('cap', '?')} ({operator.get('fillPct', 0):.1f}% full) [{operator_risk}]",
-            f"Reward Vault: {rewards.get('vaultBalance', '?')} LINK, {rewards.get('emissionPerDay', '?')}/day, runway {rewards.get('runwayDays', '?')} days [{rewards_risk}]",
-            f"Queue Depth: {queue.get('queueLink', '?')} LINK [{queue_risk}]",
-            f"Overall Treasury Risk: {overall_treasury_risk.upper()}",
-        ])
-        alerts = treasury.get("alerts", [])
-        if alerts:
-            lines.append("Active alerts:")
-            for a in alerts:
-                lines.append(f"  - {_sanitize_str(str(a), max_len=200)}")
-    else:
-        lines.append("No treasury data available.")
-
-    # Cross-workflow context: Morpho
-    lines.extend([
-        "",
-        "=" * 50,
-        "WORKFLOW 4: MORPHO VAULT HEALTH (wstLINK/LINK Lending)",
-        "=" * 50,
-    ])
-    morpho_market = morpho.get("morphoMarket", {})
-    morpho_vault = morpho.get("vault", {})
-    morpho_apy = morpho.get("apy", {})
-    if morpho_market:
-        util = morpho_market.get("utilization", 0)
-        supply_tokens = int(morpho_market.get("totalSupplyAssets", "0")) // (10 ** 18)
-        borrow_tokens = int(morpho_market.get("totalBorrowAssets", "0")) // (10 ** 18)
-        lines.extend([
-            f"Utilization: {util * 100:.2f}%",
-            f"Total Supply: {supply_tokens:,} LINK",
-            f"Total Borrow: {borrow_tokens:,} LINK",
-            f"Supply APY: {morpho_apy.get('supplyApy', 0):.2f}%",
-            f"Borrow APY: {morpho_apy.get('borrowApy', 0):.2f}%",
-        ])
-        if morpho_vault:
-            vault_assets = int(morpho_vault.get("totalAssets", "0")) // (10 ** 18)
-            share_price = _sanitize_str(str(morpho_vault.get('sharePrice', '?')), max_len=30)
-            lines.append(f"Vault Total Assets: {vault_assets:,} LINK (share price: {share_price})")
-    else:
-        lines.append("No Morpho data available.")
-
-    # Cross-workflow context: CCIP
-    lines.extend([
-        "",
-        "=" * 50,
-        "WORKFLOW 5: CCIP LANE HEALTH (Cross-Chain Bridges)",
-        "=" * 50,
-    ])
-    ccip_meta = ccip.get("metadata", {})
-    ccip_lanes = ccip.get("lanes", [])
-    if ccip_meta:
-        ccip_overall_risk = _sanitize_str(str(ccip.get('overallRisk', '?')), max_len=20)
-        lines.extend([
-            f"Lanes: {ccip_meta.get('okCount', '?')}/{ccip_meta.get('laneCount', '?')} OK",
-            f"Paused: {ccip_meta.get('pausedCount', 0)}",
-            f"Rate-limited: {ccip_meta.get('rateLimitedLanes', 0)}",
-            f"Overall: {ccip_overall_risk}",
-        ])
-        for lane in ccip_lanes:
-            rl = lane.get("rateLimiter") or {}
-            rl_str = f" (rate limiter: {rl.get('usedPct', 0)}% used)" if rl.get("isEnabled") else ""
-            dest = _sanitize_str(str(lane.get('destChainName', '?')), max_len=30)
-            status = _sanitize_str(str(lane.get('status', '?')), max_len=20)
-            lines.append(f"  {dest}: {status}{rl_str}")
-    else:
-        lines.append("No CCIP data available.")
-
-    # Cross-workflow context: Curve Pool (detailed)
-    lines.extend([
-        "",
-        "=" * 50,
-        "WORKFLOW 6: CURVE POOL (Detailed Market Structure)",
-        "=" * 50,
-    ])
-    curve_pool = curve.get("pool", {})
-    curve_gauge = curve.get("gauge", {})
-    if curve_pool:
-        curve_risk = _sanitize_str(str(curve_pool.get('risk', '?')), max_len=20)
-        virtual_price = _sanitize_str(str(curve_pool.get('virtualPrice', '?')), max_len=30)
-        amp_factor = _sanitize_str(str(curve_pool.get('amplificationFactor', '?')), max_len=20)
-        lines.extend([
-            f"LINK: {curve_pool.get('linkBalance', '?'):,.0f} ({curve_pool.get('linkPct', '?'):.1f}%)",
-            f"stLINK: {curve_pool.get('stlinkBalance', '?'):,.0f} ({curve_pool.get('stlinkPct', '?'):.1f}%)",
-            f"Imbalance: {curve_pool.get('imbalancePct', 0):.1f}% off center [{curve_risk}]",
-            f"Virtual Price: {virtual_price}",
-            f"TVL: ${curve_pool.get('tvlUsd', 0):,.0f}",
-            f"Amplification Factor: {amp_factor}",
-        ])
-        if curve_gauge:
-            gauge_staked = int(curve_gauge.get("totalStaked", "0")) // (10 ** 18)
-            lines.append(f"Gauge Staked: {gauge_staked:,} LP tokens")
-            lines.append(f"Active Rewards: {curve_gauge.get('rewardCount', 0)}")
-    else:
-        lines.append("No detailed Curve data available.")
-
-    lines.extend([
-        "",
-        "=" * 50,
-        "ANALYSIS REQUEST",
-        "=" * 50,
-        "",
-        "Given ALL of the above cross-workflow data, provide your composite recommendation.",
-        f"The isolated LAA signal (based only on Curve pool data) was: {signal.upper()}",
-        "Your recommendation should factor in the full ecosystem context.",
-    ])
-
-    return "\n".join(lines)
+    tenant_id = request.headers.get("X-Tenant-Id", "default")
+    treasury, arb = await asyncio.gather(
+        _treasury_analysis(treasury_data, tenant_id),
+        _arb_analysis(arb_data, tenant_id),
+        return_exceptions=True,
+    )
+    if isinstance(treasury, BaseException):
+        treasury = _analysis_error(treasury, "treasury")
+    if isinstance(arb, BaseException):
+        arb = _analysis_error(arb, "arb")
+    return jsonify({"treasury": treasury, "arb": arb}), 200
 
 
 @cre_bp.route("/api/cre/analyze-composite", methods=["POST"])
-def analyze_composite():
+async def analyze_composite():
     if not _check_auth():
         return jsonify({"error": "unauthorized"}), 401
     if not _rate_limit_check():
@@ -716,28 +778,24 @@ def analyze_composite():
     if not _check_circuit_breaker(tenant_id):
         return jsonify({"error": "daily API call limit reached"}), 429
 
-    data = request.get_json(force=True, silent=True) or {}
-    api_key = os.environ.get("OPENAI_API_KEY", "")
-    if not api_key:
+    data = await _read_json_body()
+    if data is None:
+        return jsonify({"error": "bad json"}), 400
+    if not _OPENAI_KEY:
         return jsonify({"error": "OPENAI_API_KEY not set"}), 503
 
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
         # Sanitize composite input before passing between pipeline stages (HIGH: cross-agent pipeline fix)
         sanitized_prompt = _sanitize_agent_output(_format_composite_prompt(data))
-        response = client.responses.create(
-            model="gpt-5.3-codex",
-            instructions=_COMPOSITE_SYSTEM_PROMPT,
-            input=sanitized_prompt,
-        )
+        async with _OPENAI_SEM:
+            response = await _get_openai().responses.create(
+                model="gpt-5.3-codex",
+                instructions=_COMPOSITE_SYSTEM_PROMPT,
+                input=sanitized_prompt,
+            )
         text = _sanitize_agent_output(response.output_text.strip())
-        if text.startswith("```"):
-            text = text.split("```")[1]
-            if text.startswith("json"):
-                text = text[4:]
-            text = text.strip()
-        result = json.loads(text)
+        text = _strip_code_fence(text)
+        result = orjson.loads(text)
         logger.info(
             "Composite AI | rec=%s risk=%s confidence=%.2f",
             result.get("recommendation"),
@@ -745,13 +803,24 @@ def analyze_composite():
             result.get("confidence", 0),
         )
         return jsonify(result), 200
-    except json.JSONDecodeError:
+    except orjson.JSONDecodeError:
         return jsonify({"error": "AI response parse error"}), 500
     except Exception:
         logger.exception("composite analyze failed")
         return jsonify({"error": "internal analysis error"}), 500
 
 
+@cre_bp.route("/api/cre/metrics", methods=["GET"])
+async def metrics():
+    if not _check_auth():
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify({
+        "cache_hits": _cache_stats["hits"],
+        "cache_misses": _cache_stats["misses"],
+        "cache_size": len(_response_cache),
+    }), 200
+
+
 # ─── SDL CCIP Bridge routes ───
 # These serve the bridge-ai-advisor CRE workflow (separate project, same tunnel)
 
@@ -768,11 +837,7 @@ def _strip_nulls(obj):
 
 def _bridge_check_auth() -> bool:
     """Auth check for bridge endpoints. Uses CRE_SECRET or falls back to CRE_ANALYZE_SECRET."""
-    secret = os.environ.get("CRE_SECRET", "") or _CRE_SECRET
-    if not secret:
-        return False  # No secret configured = reject all (fail-closed)
-    provided = request.headers.get("X-CRE-Secret", "")
-    return hmac.compare_digest(provided, secret)
+    return _secret_matches(_BRIDGE_SECRET_BYTES)
 
 
 def _bridge_heuristic(vault_state: dict) -> dict:
@@ -812,7 +877,7 @@ def _bridge_heuristic(vault_state: dict) -> dict:
 
 
 @cre_bp.route("/api/cre/analyze-bridge", methods=["POST"])
-def analyze_bridge():
+async def analyze_bridge():
     if not _bridge_check_auth():
         return jsonify({"error": "unauthorized"}), 401
     if not _rate_limit_check():
@@ -822,18 +887,16 @@ def analyze_bridge():
     if not _check_circuit_breaker(tenant_id):
         return jsonify({"error": "daily API call limit reached"}), 429
 
-    data = request.get_json(force=True, silent=True) or {}
+    data = await _read_json_body()
+    if data is None:
+        return jsonify({"error": "bad json"}), 400
     vault_state = data.get("vaultState", {})
-    api_key = os.environ.get("OPENAI_API_KEY", "")
-    if not api_key:
+    if not _OPENAI_KEY:
         result = _bridge_heuristic(vault_state)
-        import hashlib
         input_hash = hashlib.sha256(json.dumps(vault_state, sort_keys=True).encode()).hexdigest()[:8]
         result["_inputHash"] = input_hash
         return jsonify(result)
     try:
-        from openai import OpenAI
-        client = OpenAI(api_key=api_key)
         # Sanitize all string inputs before prompt interpolation (Nemesis F1 fix)
         s_free = _sanitize_str(str(vault_state.get('freeLiquidity', '0')), max_len=50)
         s_reserved = _sanitize_str(str(vault_state.get('reserved', '0')), max_len=50)
@@ -878,18 +941,15 @@ Respond with ONLY valid JSON (no markdown, no explanation outside JSON):
   "confidence": 0.0_to_1.0,
   "reasoning": "brief reasoning"
 }}"""
-        response = client.chat.completions.create(
-            model="gpt-5.2",
-            max_completion_tokens=500,
-            messages=[{"role": "user", "content": prompt}],
-        )
+        async with _OPENAI_SEM:
+            response = await _get_openai().chat.completions.create(
+                model="gpt-5.2",
+                max_completion_tokens=500,
+                messages=[{"role": "user", "content": prompt}],
+            )
         text = _sanitize_agent_output(response.choices[0].message.content.strip())
-        if text.startswith("```"):
-            text = text.split("\n", 1)[1]
-            if text.endswith("```"):
-                text = text[:-3]
-        result = _strip_nulls(json.loads(text))
-        import hashlib
+        text = _strip_code_fence(text)
+        result = _strip_nulls(orjson.loads(text))
         input_hash = hashlib.sha256(json.dumps(vault_state, sort_keys=True).encode()).hexdigest()[:8]
         result["_inputHash"] = input_hash
         logger.info("Bridge AI | risk=%s confidence=%.2f", result.get("risk"), result.get("confidence", 0))
@@ -899,17 +959,35 @@ Respond with ONLY valid JSON (no markdown, no explanation outside JSON):
         result = _bridge_heuristic(vault_state)
         result['_fallback'] = True
         result['_fallback_reason'] = str(e)
-        import hashlib
         input_hash = hashlib.sha256(json.dumps(vault_state, sort_keys=True).encode()).hexdigest()[:8]
         result["_inputHash"] = input_hash
         return jsonify(result)
 
 
-app.register_blueprint(cre_bp)
+if "cre" not in app.blueprints:
+    app.register_blueprint(cre_bp)
+
+
+def _configure_logging() -> None:
+    """Root logging at LOG_LEVEL, unless the host (e.g. --log-config) already set it up."""
+    if not logging.getLogger().handlers:
+        logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
+
+
+@app.before_serving
+async def _setup_logging():
+    # Covers `hypercorn cre_analyze_endpoint:app`, which never runs __main__
+    _configure_logging()
 
 
 if __name__ == "__main__":
+    from hypercorn.asyncio import serve
+    from hypercorn.config import Config
+
+    _configure_logging()
     port = int(os.environ.get("PORT", 5000))
     host = os.environ.get("HOST", "127.0.0.1")
+    config = Config()
+    config.bind = [f"{host}:{port}"]
     logger.info("Orbital Sentinel AI endpoint starting on %s:%d", host, port)
-    app.run(host=host, port=port)
+    asyncio.run(serve(app, config))
@@ -0,0 +1,708 @@
+"""Orbital Sentinel — CRE AI Prompts
+
+System prompts and snapshot formatters for the AI analysis endpoint
+(cre_analyze_endpoint.py). Pure string handling with no web or SDK imports,
+so every route and worker shares the single copy defined here.
+"""
+
+import re
+
+# ─── Injection pattern constants ───
+_INJECTION_PATTERNS = [
+    (re.compile(r'ignore\s+(all\s+)?previous\s+instructions?', re.IGNORECASE), '[filtered]'),
+    (re.compile(r'you\s+are\s+now\s+', re.IGNORECASE), '[filtered] '),
+    (re.compile(r'new\s+instructions?\s*:', re.IGNORECASE), '[filtered]:'),
+    (re.compile(r'system\s*:\s*', re.IGNORECASE), '[filtered]: '),
+    (re.compile(r'<\s*/?\s*system\s*>', re.IGNORECASE), ''),
+    (re.compile(r'-{3,}', re.IGNORECASE), '---'),
+]
+
+
+def _sanitize_str(value: str, max_len: int = 500) -> str:
+    """Sanitize string inputs before prompt interpolation.
+
+    Strips control characters and defangs common prompt injection patterns.
+    Applied to all externally-sourced free-text fields that flow into LLM prompts.
+    """
+    if not isinstance(value, str):
+        return str(value)[:max_len]
+    # Strip control characters (keep newlines/tabs for readability)
+    cleaned = re.sub(r'[\x00-\x08\x0b\x0c\x0e-\x1f]', '', value)
+    # Defang injection keywords
+    for pattern, replacement in _INJECTION_PATTERNS:
+        cleaned = pattern.sub(replacement, cleaned)
+    return cleaned[:max_len]
+
+
+_SYSTEM_PROMPT = """\
+You are Orbital Sentinel, an autonomous AI risk analyst for DeFi protocols built on Chainlink staking.
+
+Your task is a structured TWO-PHASE assessment of protocol health.
+
+## PHASE 1 — ATOM EVALUATION
+
+Evaluate each of the four core metrics independently against these thresholds:
+
+1. Pool fill (staking utilization — check BOTH community and operator pools):
+   - ok: all pools fill < 90%
+   - warning: any pool fill 90–99%
+   - critical: any pool fill = 100% (fully saturated, no new staking capacity)
+   - missing: fill data absent
+
+2. Reward runway (days until vault depleted):
+   - ok: runway > 30 days
+   - warning: runway 7–30 days
+   - critical: runway < 7 days
+   - missing: runway data absent
+
+3. Lending utilization (Morpho wstLINK/LINK market):
+   - ok: utilization < 85%
+   - warning: utilization 85–94%
+   - critical: utilization ≥ 95%
+   - missing: utilization data absent or "unavailable"
+
+4. Queue depth (LINK pending in priority queue):
+   - ok: queue < 1,000 LINK
+   - warning: queue 1,000–10,000 LINK
+   - critical: queue > 10,000 LINK
+   - missing: queue data absent or "unavailable"
+
+## PHASE 2 — DETERMINISTIC SYNTHESIS
+
+Combine atom results using these rules (in order of priority):
+- If ANY atom = critical → risk_label = "critical"
+- Else if ANY atom = warning → risk_label = "warning"
+- Else if all atoms = ok → risk_label = "ok"
+- If ≥ 2 atoms = missing → risk_label = "unknown"
+
+Your written assessment must cite the specific atom(s) that drove the label.
+
+## OUTPUT FORMAT
+
+Respond ONLY with valid JSON in exactly this format (no markdown, no extra keys):
+{
+  "assessment": "<1-2 sentence risk summary citing which atoms triggered the label>",
+  "risk_label": "<ok|warning|critical|unknown>",
+  "atom_status": {
+    "pool": "<ok|warning|critical|missing>",
+    "runway": "<ok|warning|critical|missing>",
+    "lending": "<ok|warning|critical|missing>",
+    "queue": "<ok|warning|critical|missing>"
+  },
+  "action_items": ["<concrete action 1>", "<concrete action 2>"],
+  "confidence": <0.0-1.0 float>
+}
+
+Rules:
+- action_items must be specific and actionable, addressing the critical/warning atoms
+- confidence: 0.9-1.0 if all atoms have data, 0.6-0.8 if some atoms are missing
+"""
+
+
+# Forced tool call for the treasury assessment: the reply arrives as a parsed
+# dict, with no fences or JSON repair needed. It carries only the narrative
+# fields of the OUTPUT FORMAT above; risk_label and atom_status are computed by
+# _compute_atoms and merged in by the endpoint, so the model does not spend
+# output tokens on them.
+_TREASURY_TOOL = {
+    "name": "risk_assessment",
+    "description": "Record the structured treasury risk assessment.",
+    "input_schema": {
+        "type": "object",
+        "properties": {
+            "assessment": {"type": "string"},
+            "action_items": {"type": "array", "items": {"type": "string"}},
+            "confidence": {"type": "number"},
+        },
+        "required": ["assessment", "action_items", "confidence"],
+    },
+}
+
+
+_PROMPT_TEMPLATE = (
+    "Timestamp: {timestamp}\n"
+    "Overall Risk: {overall_risk}\n"
+    "\n"
+    "## Staking Pools\n"
+    "Pool A: {a_staked} / {a_cap} ({a_fill:.1f}% full) — {a_risk}\n"
+    "Pool B: {b_staked} / {b_cap} ({b_fill:.1f}% full) — {b_risk}\n"
+    "\n"
+    "## Reward Vault\n"
+    "Balance: {vault_balance} tokens\n"
+    "Emission: {emission} tokens/day\n"
+    "Runway: {runway:.0f} days — {rewards_risk}\n"
+    "\n"
+    "## Lending Market\n"
+    "Utilization: {util} — {morpho_risk}\n"
+    "Vault TVL: {tvl}\n"
+    "\n"
+    "## Priority Queue\n"
+    "Queue Depth: {queue_depth} — {queue_risk}\n"
+    "\n"
+)
+
+
+def _format_prompt(data: dict) -> str:
+    alerts = data.get("alerts", [])
+    staking = data.get("staking", {})
+    rewards = data.get("rewards", {})
+    morpho = data.get("morpho", {})
+    queue = data.get("queue", {})
+
+    community = staking.get("community", {})
+    operator = staking.get("operator", {})
+
+    morpho_util = morpho.get("utilization")
+    tvl = morpho.get("vaultTvlUsd")
+    q = queue.get("queueLink")
+
+    body = _PROMPT_TEMPLATE.format_map({
+        "timestamp": data.get("timestamp", "unknown"),
+        "overall_risk": data.get("overallRisk", "unknown").upper(),
+        "a_staked": community.get("staked", "?"),
+        "a_cap": community.get("cap", "?"),
+        "a_fill": community.get("fillPct", 0),
+        "a_risk": community.get("risk", "?"),
+        "b_staked": operator.get("staked", "?"),
+        "b_cap": operator.get("cap", "?"),
+        "b_fill": operator.get("fillPct", 0),
+        "b_risk": operator.get("risk", "?"),
+        "vault_balance": rewards.get("vaultBalance", "?"),
+        "emission": rewards.get("emissionPerDay", "?"),
+        "runway": rewards.get("runwayDays", 0),
+        "rewards_risk": rewards.get("risk", "?"),
+        "util": f"{morpho_util:.1f}%" if morpho_util is not None else "unavailable",
+        "morpho_risk": morpho.get("risk", "?"),
+        "tvl": f"${tvl:,.0f}" if tvl is not None else "unavailable",
+        "queue_depth": f"{q:,.0f} tokens" if q is not None else "unavailable",
+        "queue_risk": queue.get("risk", "?"),
+    })
+
+    if not alerts:
+        return body + "No active alerts."
+    return body + "\n".join(("## Active Alerts", *(f"- {_sanitize_str(str(a), 200)}" for a in alerts)))
+
+
+def _as_number(value):
+    """Return value if it is a real number (not bool), else None."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+def _section(obj, key: str) -> dict:
+    """obj[key] if both are dicts, else {} (a null or malformed section reads as missing)."""
+    value = obj.get(key) if isinstance(obj, dict) else None
+    return value if isinstance(value, dict) else {}
+
+
+def _compute_atoms(data: dict) -> dict:
+    """Deterministic PHASE 1 + PHASE 2 of _SYSTEM_PROMPT, evaluated in Python.
+
+    Returns {"risk_label": ..., "atom_status": {"pool", "runway", "lending", "queue"}}
+    using the same thresholds the prompt gives the model.
+    """
+    staking = _section(data, "staking")
+    fills = [
+        f for f in (
+            _as_number(_section(staking, "community").get("fillPct")),
+            _as_number(_section(staking, "operator").get("fillPct")),
+        )
+        if f is not None
+    ]
+    runway = _as_number(_section(data, "rewards").get("runwayDays"))
+    util = _as_number(_section(data, "morpho").get("utilization"))
+    queue = _as_number(_section(data, "queue").get("queueLink"))
+
+    if not fills:
+        pool_status = "missing"
+    elif max(fills) >= 100:
+        pool_status = "critical"
+    elif max(fills) >= 90:
+        pool_status = "warning"
+    else:
+        pool_status = "ok"
+
+    if runway is None:
+        runway_status = "missing"
+    elif runway < 7:
+        runway_status = "critical"
+    elif runway <= 30:
+        runway_status = "warning"
+    else:
+        runway_status = "ok"
+
+    if util is None:
+        lending_status = "missing"
+    elif util >= 95:
+        lending_status = "critical"
+    elif util >= 85:
+        lending_status = "warning"
+    else:
+        lending_status = "ok"
+
+    if queue is None:
+        queue_status = "missing"
+    elif queue > 10_000:
+        queue_status = "critical"
+    elif queue >= 1_000:
+        queue_status = "warning"
+    else:
+        queue_status = "ok"
+
+    atom_status = {
+        "pool": pool_status,
+        "runway": runway_status,
+        "lending": lending_status,
+        "queue": queue_status,
+    }
+    return {"risk_label": _risk_label(atom_status), "atom_status": atom_status}
+
+
+def _risk_label(atom_status: dict) -> str:
+    """PHASE 2 synthesis: combine the four atom statuses into one risk label."""
+    statuses = list(atom_status.values())
+    if "critical" in statuses:
+        return "critical"
+    if "warning" in statuses:
+        return "warning"
+    if statuses.count("missing") >= 2:
+        return "unknown"
+    return "ok"
+
+
+_ATOMS_TEMPLATE = (
+    "\n\n## Precomputed Atoms (deterministic, use as-is)\n"
+    "Pool: {pool} | Runway: {runway} | Lending: {lending} | Queue: {queue}\n"
+    "risk_label: {risk_label}\n"
+    "Focus on the assessment and action_items for these atoms."
+)
+
+
+def _format_atoms(atoms: dict) -> str:
+    """Prompt suffix telling the model the already-computed atoms and label."""
+    return _ATOMS_TEMPLATE.format_map({**atoms["atom_status"], "risk_label": atoms["risk_label"]})
+
+
+_ARB_SYSTEM_PROMPT = """\
+You are Orbital Sentinel, an autonomous AI analyst for the stLINK Arb Vault — a DeFi vault that captures the stLINK premium on Curve's stLINK/LINK StableSwap pool.
+
+The vault works by: selling stLINK → LINK on Curve (when stLINK trades at a premium), then depositing LINK to the Priority Pool at 1:1 to get new stLINK, pocketing the premium.
+
+## YOUR TASK
+
+Analyze the current market conditions and recommend an action.
+
+## INPUT DATA
+
+You will receive:
+- **Pool state**: Curve pool LINK and stLINK balances, imbalance ratio
+- **Premium quotes**: Simulated swap outputs at different sizes (100, 500, 1000, 5000 stLINK)
+- **Priority Pool**: Status (OPEN/DRAINING/CLOSED) and queued LINK
+- **Vault state**: stLINK held, LINK queued, cycle count, capital assets (if vault deployed)
+- **Signal**: Deterministic signal from math (execute/wait/unprofitable/pool_closed/no_stlink)
+
+## ANALYSIS FRAMEWORK
+
+1. **Premium quality**: Are premiums consistent across swap sizes? Larger swaps with lower premium = pool will move fast. Assess slippage risk.
+2. **Timing**: Is the pool imbalance growing or stable? High LINK/stLINK ratio = more premium potential.
+3. **Size recommendation**: Based on premium decay across quote sizes, what's the optimal swap amount?
+4. **Priority Pool health**: If queue is very large, claimed stLINK may take longer to convert back.
+5. **Risk factors**: Any red flags? (e.g., pool nearly balanced = premium could vanish, PP closed, very low premium)
+
+## OUTPUT FORMAT
+
+Respond ONLY with valid JSON (no markdown, no extra keys):
+{
+  "recommendation": "<execute|wait|skip>",
+  "assessment": "<2-3 sentence analysis of current conditions>",
+  "optimal_swap_size": "<recommended stLINK amount to swap, e.g. '1000'>",
+  "risk_factors": ["<risk 1>", "<risk 2>"],
+  "confidence": <0.0-1.0 float>,
+  "reasoning": "<1 sentence explaining the recommendation>"
+}
+
+Rules:
+- recommendation must agree with the math signal unless you have strong reason to override
+- If signal is "execute" but premium is very thin (<5 bps), recommend "wait"
+- If signal is "wait" but pool conditions suggest premium is growing, note that
+- confidence: 0.9+ when data is complete and clear, 0.5-0.7 when conditions are ambiguous
+"""
+
+
+# Structured Outputs format for the arb Responses call (strict JSON schema).
+_ARB_TEXT_FORMAT = {
+    "format": {
+        "type": "json_schema",
+        "name": "arb_analysis",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "recommendation": {"type": "string", "enum": ["execute", "wait", "skip"]},
+                "assessment": {"type": "string"},
+                "optimal_swap_size": {"type": "string"},
+                "risk_factors": {"type": "array", "items": {"type": "string"}},
+                "confidence": {"type": "number"},
+                "reasoning": {"type": "string"},
+            },
+            "required": ["recommendation", "assessment", "optimal_swap_size", "risk_factors", "confidence", "reasoning"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+_PP_STATUS_NAMES = {0: "OPEN", 1: "DRAINING", 2: "CLOSED"}
+
+_ARB_PROMPT_HEAD = (
+    "Deterministic signal: {signal}\n"
+    "\n"
+    "## Curve Pool State\n"
+    "LINK balance: {link_balance}\n"
+    "stLINK balance: {stlink_balance}\n"
+    "Imbalance ratio (LINK/stLINK): {imbalance:.4f}\n"
+    "\n"
+    "## Premium Quotes (stLINK \u2192 LINK)"
+)
+
+_ARB_PROMPT_PRIORITY_POOL = (
+    "\n"
+    "## Priority Pool\n"
+    "Status: {pp_status}\n"
+    "Queued: {pp_queued} LINK"
+)
+
+_ARB_PROMPT_VAULT = (
+    "\n"
+    "## Vault State\n"
+    "stLINK held: {stlink_held}\n"
+    "LINK queued: {link_queued}\n"
+    "Cycle count: {cycle_count}\n"
+    "Capital assets: {capital_assets} LINK\n"
+    "Min profit threshold: {min_profit} bps"
+)
+
+
+def _format_arb_prompt(data: dict) -> str:
+    pool = data.get("poolState", {})
+    pp_status = data.get("priorityPoolStatus", -1)
+    vault = data.get("vaultState")
+
+    parts = [_ARB_PROMPT_HEAD.format_map({
+        "signal": _sanitize_str(data.get("signal", "unknown")).upper(),
+        "link_balance": _sanitize_str(str(pool.get('linkBalanceFormatted', '?'))),
+        "stlink_balance": _sanitize_str(str(pool.get('stLINKBalanceFormatted', '?'))),
+        "imbalance": pool.get('imbalanceRatio', 0),
+    })]
+
+    for q in data.get("premiumQuotes", []):
+        amt_in = _sanitize_str(str(q.get('amountInFormatted', '?')))
+        amt_out = _sanitize_str(str(q.get('amountOutFormatted', '?')))
+        premium_bps = q.get('premiumBps', 0)
+        premium_bps = int(premium_bps) if isinstance(premium_bps, (int, float)) else 0
+        parts.append(f"  {amt_in} stLINK \u2192 {amt_out} LINK ({premium_bps} bps)")
+
+    parts.append(_ARB_PROMPT_PRIORITY_POOL.format_map({
+        "pp_status": _PP_STATUS_NAMES.get(pp_status, f"UNKNOWN({pp_status})"),
+        "pp_queued": formatUnits_py(data.get("priorityPoolQueued", "0")),
+    }))
+
+    if vault:
+        parts.append(_ARB_PROMPT_VAULT.format_map({
+            "stlink_held": formatUnits_py(vault.get('totalStLINKHeld', '0')),
+            "link_queued": formatUnits_py(vault.get('totalLINKQueued', '0')),
+            "cycle_count": _sanitize_str(str(vault.get('cycleCount', '0')), max_len=20),
+            "capital_assets": formatUnits_py(vault.get('totalCapitalAssets', '0')),
+            "min_profit": _sanitize_str(str(vault.get('minProfitBps', '?')), max_len=20),
+        }))
+
+    return "\n".join(parts)
+
+
+_POW10: dict[int, int] = {}
+_ZERO_VALUES = ("0", "0x0")
+
+
+def formatUnits_py(value_str: str, decimals: int = 18) -> str:
+    try:
+        base = _POW10.get(decimals)
+        if base is None:
+            base = _POW10[decimals] = 10 ** decimals
+        whole, frac = (0, 0) if value_str in _ZERO_VALUES else divmod(int(value_str), base)
+        return f"{whole:,}.{str(frac).zfill(decimals)[:2]}"
+    except (ValueError, TypeError):
+        return str(value_str)
+
+
+_COMPOSITE_SYSTEM_PROMPT = """\
+You are Orbital Sentinel, an autonomous AI analyst with FULL ECOSYSTEM VISIBILITY across 6 Chainlink CRE workflows monitoring the stake.link protocol.
+
+You are analyzing an stLINK arbitrage opportunity on Curve's stLINK/LINK StableSwap pool. Unlike a standard arb analysis that only sees pool data, you have access to cross-workflow intelligence from the entire stake.link ecosystem, collected in a unified CRE cycle.
+
+The arb mechanism: sell stLINK for LINK on Curve (when stLINK trades at a premium), then deposit LINK to the Priority Pool at 1:1 to get new stLINK, pocketing the premium.
+
+## CROSS-WORKFLOW SIGNAL INTERPRETATION
+
+Each ecosystem signal affects the arb decision differently:
+
+1. **Price Feeds (LINK/USD, ETH/USD)**: USD-denominated profitability. A 17 bps stLINK premium means ~$0.015/LINK at $9 LINK, but if LINK is in a sharp decline, the arb profit could be wiped out by price movement during the cycle time (deposit LINK, wait for stLINK mint, sell stLINK).
+
+2. **Treasury Risk (staking pools, reward runway, queue depth)**: Structural signals.
+   - Community pool at 100% = no new staking capacity = excess demand for stLINK = premium likely persists or grows (BULLISH for arb)
+   - Large Priority Pool queue = slow capital recycling = longer time between arb cycles (CAUTION: capital efficiency drops)
+   - Low reward runway = potential staking reward reduction = could reduce stLINK demand long-term
+
+3. **Morpho Vault Health (wstLINK/LINK lending)**: Supply pressure signal.
+   - High utilization (>85%) = wstLINK locked as collateral = less stLINK available on open market = supports premium
+   - Low utilization = more wstLINK could be unwrapped and sold, compressing the premium
+
+4. **CCIP Lane Health (cross-chain bridges)**: Flow disruption signal.
+   - Degraded lanes = cross-chain LINK movement restricted = could trap liquidity, affecting Curve pool dynamics
+   - All lanes OK = normal cross-chain flows, no disruption to expect
+
+5. **Curve Pool (detailed composition, gauge, TVL)**: Market structure.
+   - Pool imbalance % and direction = premium sustainability
+   - Gauge rewards = incentive for LPs to rebalance (active rewards attract rebalancing liquidity)
+   - TVL = depth available for swaps without excessive slippage
+
+## YOUR TASK
+
+Synthesize ALL cross-workflow signals into a unified arb recommendation. Your analysis must explicitly reference how each ecosystem signal influenced your decision. Do not ignore any signal.
+
+## OUTPUT FORMAT
+
+Respond ONLY with valid JSON (no markdown, no extra keys):
+{
+  "recommendation": "<execute|wait|skip>",
+  "composite_risk": "<ok|warning|critical>",
+  "assessment": "<3-4 sentence analysis integrating ALL cross-workflow signals>",
+  "optimal_swap_size": "<recommended stLINK amount>",
+  "ecosystem_factors": {
+    "price_impact": "<how LINK/USD price affects this arb>",
+    "treasury_impact": "<how staking pool state affects premium persistence>",
+    "morpho_impact": "<how lending utilization affects stLINK supply>",
+    "ccip_impact": "<how bridge status affects liquidity flows>",
+    "curve_impact": "<how pool structure affects execution>"
+  },
+  "risk_factors": ["<risk 1>", "<risk 2>", "<risk 3>"],
+  "confidence": <0.0-1.0>,
+  "reasoning": "<1-2 sentence summary of why this recommendation differs from or agrees with the isolated LAA signal>"
+}
+
+Rules:
+- composite_risk reflects the OVERALL ecosystem health, not just the arb opportunity
+- recommendation can DISAGREE with the isolated LAA signal when ecosystem data warrants it
+- If the isolated signal is "execute" but ecosystem signals show stress (e.g., LINK price dropping + high Morpho util + degraded CCIP), recommend "wait"
+- If the isolated signal is "wait" but ecosystem signals are strongly supportive (100% pool fill + healthy Morpho + stable prices), consider upgrading to "execute"
+- confidence: 0.9+ when all workflows provided data, 0.6-0.8 when some signals are missing
+- Every field in ecosystem_factors must reference specific numbers from the input data
+"""
+
+
+def _format_composite_prompt(data: dict) -> str:
+    laa = data.get("laa", {})
+    feeds = data.get("feeds", {})
+    treasury = data.get("treasury", {})
+    morpho = data.get("morpho", {})
+    ccip = data.get("ccip", {})
+    curve = data.get("curve", {})
+
+    signal = _sanitize_str(laa.get("signal", "unknown"))
+    pool = laa.get("poolState", {})
+    quotes = laa.get("premiumQuotes", [])
+    pp_status = laa.get("priorityPoolStatus", -1)
+    pp_queued = laa.get("priorityPoolQueued", "0")
+    vault = laa.get("vaultState")
+
+    pp_status_str = _PP_STATUS_NAMES.get(pp_status, f"UNKNOWN({pp_status})")
+
+    link_balance = _sanitize_str(str(pool.get('linkBalanceFormatted', '?')))
+    stlink_balance = _sanitize_str(str(pool.get('stLINKBalanceFormatted', '?')))
+
+    lines = [
+        f"Isolated LAA signal: {signal.upper()}",
+        "",
+        "=" * 50,
+        "WORKFLOW 1: LAA (LINK AI Arbitrage)",
+        "=" * 50,
+        "",
+        "## Curve Pool State (from LAA)",
+        f"LINK balance: {link_balance}",
+        f"stLINK balance: {stlink_balance}",
+        f"Imbalance ratio (LINK/stLINK): {pool.get('imbalanceRatio', 0):.4f}",
+        "",
+        "## Premium Quotes (stLINK to LINK)",
+    ]
+
+    for q in quotes:
+        amt_in = _sanitize_str(str(q.get('amountInFormatted', '?')))
+        amt_out = _sanitize_str(str(q.get('amountOutFormatted', '?')))
+        premium_bps = int(q.get('premiumBps', 0)) if isinstance(q.get('premiumBps', 0), (int, float)) else 0
+        lines.append(f"  {amt_in} stLINK -> {amt_out} LINK ({premium_bps} bps)")
+
+    lines.extend([
+        "",
+        "## Priority Pool (from LAA)",
+        f"Status: {pp_status_str}",
+        f"Queued: {formatUnits_py(pp_queued)} LINK",
+    ])
+
+    if vault:
+        cycle_count = _sanitize_str(str(vault.get('cycleCount', '0')), max_len=20)
+        min_profit = _sanitize_str(str(vault.get('minProfitBps', '?')), max_len=20)
+        lines.extend([
+            "",
+            "## Vault State (from LAA)",
+            f"stLINK held: {formatUnits_py(vault.get('totalStLINKHeld', '0'))}",
+            f"LINK queued: {formatUnits_py(vault.get('totalLINKQueued', '0'))}",
+            f"Cycle count: {cycle_count}",
+            f"Capital assets: {formatUnits_py(vault.get('totalCapitalAssets', '0'))} LINK",
+            f"Min profit threshold: {min_profit} bps",
+        ])
+
+    # Cross-workflow context: Price Feeds
+    lines.extend([
+        "",
+        "=" * 50,
+        "WORKFLOW 2: PRICE FEEDS (Chainlink Data Feeds)",
+        "=" * 50,
+    ])
+    monitor = feeds.get("monitor", {})
+    if monitor:
+        depeg_status = _sanitize_str(str(monitor.get('depegStatus', '?')), max_len=20)
+        lines.extend([
+            f"LINK/USD: ${monitor.get('linkUsd', '?')}",
+            f"ETH/USD: ${monitor.get('ethUsd', '?')}",
+            f"stLINK/LINK price ratio: {monitor.get('stlinkLinkPriceRatio', '?')}",
+            f"Depeg status: {depeg_status} ({monitor.get('depegBps', '?')} bps from parity)",
+        ])
+    else:
+        lines.append("No price feed data available.")
+
+    # Cross-workflow context: Treasury Risk
+    lines.extend([
+        "",
+        "=" * 50,
+        "WORKFLOW 3: TREASURY RISK (Staking Health)",
+        "=" * 50,
+    ])
+    staking = treasury.get("staking", {})
+    community = staking.get("community", {})
+    operator = staking.get("operator", {})
+    rewards = treasury.get("rewards", {})
+    queue = treasury.get("queue", {})
+    if staking:
+        community_risk = _sanitize_str(str(community.get('risk', '?')), max_len=20)
+        operator_risk = _sanitize_str(str(operator.get('risk', '?')), max_len=20)
+        rewards_risk = _sanitize_str(str(rewards.get('risk', '?')), max_len=20)
+        queue_risk = _sanitize_str(str(queue.get('risk', '?')), max_len=20)
+        overall_treasury_risk = _sanitize_str(str(treasury.get('overallRisk', '?')), max_len=20)
+        lines.extend([
+            f"Community Pool: {community.get('staked', '?')} / {community.get('cap', '?')} ({community.get('fillPct', 0):.1f}% full) [{community_risk}]",
+            f"Operator Pool: {operator.get('staked', '?')} / {operator.get('cap', '?')} ({operator.get('fillPct', 0):.1f}% full) [{operator_risk}]",
+            f"Reward Vault: {rewards.get('vaultBalance', '?')} LINK, {rewards.get('emissionPerDay', '?')}/day, runway {rewards.get('runwayDays', '?')} days [{rewards_risk}]",
+            f"Queue Depth: {queue.get('queueLink', '?')} LINK [{queue_risk}]",
+            f"Overall Treasury Risk: {overall_treasury_risk.upper()}",
+        ])
+        alerts = treasury.get("alerts", [])
+        if alerts:
+            lines.append("Active alerts:")
+            for a in alerts:
+                lines.append(f"  - {_sanitize_str(str(a), max_len=200)}")
+    else:
+        lines.append("No treasury data available.")
+
+    # Cross-workflow context: Morpho
+    lines.extend([
+        "",
+        "=" * 50,
+        "WORKFLOW 4: MORPHO VAULT HEALTH (wstLINK/LINK Lending)",
+        "=" * 50,
+    ])
+    morpho_market = morpho.get("morphoMarket", {})
+    morpho_vault = morpho.get("vault", {})
+    morpho_apy = morpho.get("apy", {})
+    if morpho_market:
+        util = morpho_market.get("utilization", 0)
+        supply_tokens = int(morpho_market.get("totalSupplyAssets", "0")) // (10 ** 18)
+        borrow_tokens = int(morpho_market.get("totalBorrowAssets", "0")) // (10 ** 18)
+        lines.extend([
+            f"Utilization: {util * 100:.2f}%",
+            f"Total Supply: {supply_tokens:,} LINK",
+            f"Total Borrow: {borrow_tokens:,} LINK",
+            f"Supply APY: {morpho_apy.get('supplyApy', 0):.2f}%",
+            f"Borrow APY: {morpho_apy.get('borrowApy', 0):.2f}%",
+        ])
+        if morpho_vault:
+            vault_assets = int(morpho_vault.get("totalAssets", "0")) // (10 ** 18)
+            share_price = _sanitize_str(str(morpho_vault.get('sharePrice', '?')), max_len=30)
+            lines.append(f"Vault Total Assets: {vault_assets:,} LINK (share price: {share_price})")
+    else:
+        lines.append("No Morpho data available.")
+
+    # Cross-workflow context: CCIP
+    lines.extend([
+        "",
+        "=" * 50,
+        "WORKFLOW 5: CCIP LANE HEALTH (Cross-Chain Bridges)",
+        "=" * 50,
+    ])
+    ccip_meta = ccip.get("metadata", {})
+    ccip_lanes = ccip.get("lanes", [])
+    if ccip_meta:
+        ccip_overall_risk = _sanitize_str(str(ccip.get('overallRisk', '?')), max_len=20)
+        lines.extend([
+            f"Lanes: {ccip_meta.get('okCount', '?')}/{ccip_meta.get('laneCount', '?')} OK",
+            f"Paused: {ccip_meta.get('pausedCount', 0)}",
+            f"Rate-limited: {ccip_meta.get('rateLimitedLanes', 0)}",
+            f"Overall: {ccip_overall_risk}",
+        ])
+        for lane in ccip_lanes:
+            rl = lane.get("rateLimiter") or {}
+            rl_str = f" (rate limiter: {rl.get('usedPct', 0)}% used)" if rl.get("isEnabled") else ""
+            dest = _sanitize_str(str(lane.get('destChainName', '?')), max_len=30)
+            status = _sanitize_str(str(lane.get('status', '?')), max_len=20)
+            lines.append(f"  {dest}: {status}{rl_str}")
+    else:
+        lines.append("No CCIP data available.")
+
+    # Cross-workflow context: Curve Pool (detailed)
+    lines.extend([
+        "",
+        "=" * 50,
+        "WORKFLOW 6: CURVE POOL (Detailed Market Structure)",
+        "=" * 50,
+    ])
+    curve_pool = curve.get("pool", {})
+    curve_gauge = curve.get("gauge", {})
+    if curve_pool:
+        curve_risk = _sanitize_str(str(curve_pool.get('risk', '?')), max_len=20)
+        virtual_price = _sanitize_str(str(curve_pool.get('virtualPrice', '?')), max_len=30)
+        amp_factor = _sanitize_str(str(curve_pool.get('amplificationFactor', '?')), max_len=20)
+        lines.extend([
+            f"LINK: {curve_pool.get('linkBalance', '?'):,.0f} ({curve_pool.get('linkPct', '?'):.1f}%)",
+            f"stLINK: {curve_pool.get('stlinkBalance', '?'):,.0f} ({curve_pool.get('stlinkPct', '?'):.1f}%)",
+            f"Imbalance: {curve_pool.get('imbalancePct', 0):.1f}% off center [{curve_risk}]",
+            f"Virtual Price: {virtual_price}",
+            f"TVL: ${curve_pool.get('tvlUsd', 0):,.0f}",
+            f"Amplification Factor: {amp_factor}",
+        ])
+        if curve_gauge:
+            gauge_staked = int(curve_gauge.get("totalStaked", "0")) // (10 ** 18)
+            lines.append(f"Gauge Staked: {gauge_staked:,} LP tokens")
+            lines.append(f"Active Rewards: {curve_gauge.get('rewardCount', 0)}")
+    else:
+        lines.append("No detailed Curve data available.")
+
+    lines.extend([
+        "",
+        "=" * 50,
+        "ANALYSIS REQUEST",
+        "=" * 50,
+        "",
+        "Given ALL of the above cross-workflow data, provide your composite recommendation.",
+        f"The isolated LAA signal (based only on Curve pool data) was: {signal.upper()}",
+        "Your recommendation should factor in the full ecosystem context.",
+    ])
+
+    return "\n".join(lines)